@@ -1,17 +1,29 @@
 import argparse
+import contextlib
+import json
 import os
 import shutil
+import sys
+import time
 from modules.vector_store import VectorDBManager
 from modules.classifier import SemanticClassifier
 from modules.doc_processor import DocumentProcessor
+from modules.watcher import FolderWatcher
+from modules.journal import BatchJournal
+from modules.ingest import prepare_paper, commit_papers, finish_interrupted_moves
+from modules.config import (IMAGE_EXTENSIONS, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL,
+                            WATCH_BATCH_SIZE, WATCH_STATS_INTERVAL, ENCODER_NUM_THREADS,
+                            ENCODER_MIN_AGREEMENT)
 
 
 def add_paper(args):
     """单篇论文处理逻辑 (封装为内部函数供批量处理调用)"""
-    return _process_single_file(args.path, args.topics)
+    doc_processor = DocumentProcessor(skip_references=not args.keep_references)
+    return _process_single_file(args.path, args.topics, doc_processor=doc_processor)
 
 
-def _process_single_file(file_path, topics_str, db_manager=None, classifier=None, doc_processor=None):
+def _process_single_file(file_path, topics_str, db_manager=None, classifier=None, doc_processor=None,
+                         journal=None):
     """内部核心逻辑：处理单份 PDF 文件"""
     topics = [t.strip() for t in topics_str.split(",")]
 
@@ -21,26 +33,12 @@ def _process_single_file(file_path, topics_str, db_manager=None, classifier=None
     db_manager = db_manager or VectorDBManager()
 
     try:
-        print(f"🔄 正在处理: {os.path.basename(file_path)} ...")
-        # 读取并切片
-        splits, first_page_text = doc_processor.load_and_split(file_path)
-
-        # 语义分类
-        category = classifier.classify_paper(first_page_text, topics)
-        print(f"✅ 归类结果: [{category}]")
-
-        # 移动文件
-        new_path = doc_processor.move_file(file_path, category)
-
-        # 更新元数据并存入向量库
-        for split in splits:
-            split.metadata['source'] = new_path
-            split.metadata['category'] = category
-
-        db_manager.add_documents(splits)
-        return True
+        prepared = prepare_paper(file_path, topics, classifier, doc_processor)
+        return len(commit_papers([prepared], db_manager, doc_processor, journal)) == 1
     except Exception as e:
         print(f"❌ 处理 {file_path} 出错: {e}")
+        if journal:
+            journal.record(file_path, "failed", error=str(e))
         return False
 
 
@@ -51,23 +49,39 @@ def batch_process_papers(args):
         return
 
     # 初始化管理器（在此初始化可实现模型复用，避免循环加载）
-    doc_processor = DocumentProcessor()
+    doc_processor = DocumentProcessor(skip_references=not args.keep_references)
     classifier = SemanticClassifier()
     db_manager = VectorDBManager()
 
-    files = [f for f in os.listdir(args.dir) if f.lower().endswith('.pdf')]
-    if not files:
-        print(f"ℹ️ 在目录 {args.dir} 中未找到 PDF 文件。")
-        return
+    with BatchJournal("papers", args.dir, resume=args.resume) as journal:
+        if args.resume:
+            finish_interrupted_moves(journal, db_manager, doc_processor)
+
+        files = [f for f in os.listdir(args.dir) if f.lower().endswith('.pdf')]
+        if args.resume:
+            files = [f for f in files if journal.stage(os.path.join(args.dir, f)) != "done"]
+        if not files:
+            print(f"ℹ️ 在目录 {args.dir} 中未找到待处理的 PDF 文件。")
+            return
 
-    print(f"🚀 开始批量处理 {len(files)} 个文件...")
-    success_count = 0
-    for filename in files:
-        full_path = os.path.join(args.dir, filename)
-        if _process_single_file(full_path, args.topics, db_manager, classifier, doc_processor):
-            success_count += 1
+        print(f"🚀 开始批量处理 {len(files)} 个文件... (日志: {journal.path})")
+        success_count = 0
+        for filename in files:
+            full_path = os.path.join(args.dir, filename)
+            if _process_single_file(full_path, args.topics, db_manager, classifier, doc_processor, journal):
+                success_count += 1
 
     print(f"\n✨ 批量整理完成！成功处理: {success_count}/{len(files)}")
+    _print_chunk_stats(doc_processor)
+
+
+def _print_chunk_stats(doc_processor):
+    """汇总结构化切片相比逐页通用切片节省的片段数"""
+    stats = doc_processor.stats
+    if stats["papers"]:
+        saved = stats["baseline_chunks"] - stats["chunks"]
+        print(f"✂️ 共 {stats['papers']} 篇论文，入库片段 {stats['chunks']} 个，"
+              f"较通用切分节省 {saved} 个 ({saved / max(stats['baseline_chunks'], 1) * 100:.1f}%)")
 
 
 def search_paper(args):
@@ -102,20 +116,77 @@ def search_paper(args):
             print("-" * 60)
 
 
+def search_batch(args):
+    """批量搜索：从文件或标准输入读取查询 (每行一条)，以 JSONL 流式输出结果"""
+    if args.queries != "-" and not os.path.isfile(args.queries):
+        print(f"❌ 错误：找不到查询文件 {args.queries}", file=sys.stderr)
+        return
+
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if args.queries == "-" else stack.enter_context(open(args.queries, encoding="utf-8"))
+        queries = [line.strip() for line in source if line.strip()]
+        if not queries:
+            print("ℹ️ 没有读取到任何查询。", file=sys.stderr)
+            return
+
+        out = stack.enter_context(open(args.output, "w", encoding="utf-8")) if args.output else sys.stdout
+        # 标准输出只保留 JSONL 结果，模型加载等日志转到标准错误
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+
+        db_manager = VectorDBManager()
+        print(f"🚀 开始批量搜索 {len(queries)} 条查询 ({args.type}) ...")
+        start = time.perf_counter()
+
+        if args.type == "image":
+            batches = db_manager.search_images_batch(queries, k=args.k, batch_size=args.batch_size)
+        else:
+            batches = db_manager.search_papers_batch(queries, k=args.k, batch_size=args.batch_size)
+
+        for query, results in zip(queries, batches):
+            if args.type == "image":
+                hits = results
+            else:
+                hits = []
+                for doc, score in results:
+                    hits.append({
+                        "source": doc.metadata.get('source', 'Unknown'),
+                        "page": doc.metadata.get('page', 0) + 1,
+                        "category": doc.metadata.get('category', 'Uncategorized'),
+                        "section": doc.metadata.get('section'),
+                        "score": score,
+                        "content": doc.page_content,
+                    })
+            out.write(json.dumps({"query": query, "results": hits}, ensure_ascii=False) + "\n")
+            out.flush()
+
+        elapsed = time.perf_counter() - start
+        print(f"✨ 完成 {len(queries)} 条查询，耗时 {elapsed:.2f}s ({len(queries) / elapsed:.1f} 条/秒)")
+
+
 def index_images(args):
-    """图像索引 """
-    db_manager = VectorDBManager()
-    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp')
+    """图像索引 (按批编码，逐批写入断点日志)"""
     if not os.path.exists(args.dir):
         print(f"❌ 错误：找不到目录 {args.dir}")
         return
-    img_count = 0
-    for root, _, files in os.walk(args.dir):
-        for file in files:
-            if file.lower().endswith(image_extensions):
-                full_path = os.path.join(root, file)
-                if db_manager.add_image(full_path):
-                    img_count += 1
+    db_manager = VectorDBManager()
+
+    with BatchJournal("images", args.dir, resume=args.resume) as journal:
+        paths = []
+        for root, _, files in os.walk(args.dir):
+            for file in files:
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    full_path = os.path.join(root, file)
+                    if not (args.resume and journal.stage(full_path) == "done"):
+                        paths.append(full_path)
+
+        img_count = 0
+        for start in range(0, len(paths), args.batch_size):
+            batch = paths[start:start + args.batch_size]
+            indexed = db_manager.add_images(batch)
+            journal.record_many(indexed, "done")
+            journal.record_many(sorted(set(batch) - set(indexed)), "failed")
+            img_count += len(indexed)
+            print(f"🖼️ 进度 {min(start + args.batch_size, len(paths))}/{len(paths)}")
     print(f"✨ 图像库更新完毕，共处理 {img_count} 张图片。")
 
 
@@ -135,6 +206,158 @@ def search_image(args):
         print("-" * 60)
 
 
+def export_encoders(args):
+    """导出 int8 优化编码器，并与 eager 模型对比向量一致性与吞吐量"""
+    from PIL import Image
+    from modules.encoders import export_clip, export_sentence, compare_backends
+
+    clip_dir, clip_exported = export_clip(args.backend, force=args.force)
+    sentence_dir, sentence_exported = export_sentence(args.backend, force=args.force)
+
+    if args.skip_check:
+        print(f"⚠️ 已跳过一致性校验，{args.backend} 编码器未经验证。")
+        return
+
+    images = []
+    if os.path.isdir(args.image_dir):
+        for file in sorted(os.listdir(args.image_dir)):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(Image.open(os.path.join(args.image_dir, file)).convert("RGB"))
+    sentences = [
+        "Attention is all you need for sequence transduction.",
+        "Deep residual learning eases the training of very deep networks.",
+        "a photo of a dog running on the beach",
+        "Policy gradient methods optimize the expected return directly.",
+    ] * 64
+
+    report = compare_backends(args.backend, images, sentences,
+                              batch_size=args.batch_size, num_threads=args.threads)
+
+    checks = (("image_agreement", "CLIP 图像", clip_dir, clip_exported),
+              ("clip_text_agreement", "CLIP 文本", clip_dir, clip_exported),
+              ("sentence_agreement", "MiniLM", sentence_dir, sentence_exported))
+    print("\n" + "=" * 60)
+    print(f"📏 后端: {report['backend']} | 线程数: {report['threads']}")
+    for key, label, _, _ in checks:
+        if key in report:
+            mean, worst = report[key]
+            print(f"🎯 {label} 向量一致性: 平均余弦 {mean:.4f} | 最低 {worst:.4f}")
+    if "images_per_sec" in report:
+        eager, fast = report["images_per_sec"]
+        print(f"🖼️ images/sec: eager {eager:.1f} -> {args.backend} {fast:.1f} ({fast / eager:.2f}x)")
+    eager, fast = report["sentences_per_sec"]
+    print(f"📝 sentences/sec: eager {eager:.1f} -> {args.backend} {fast:.1f} ({fast / eager:.2f}x)")
+
+    failed = [check for check in checks if check[0] in report and report[check[0]][0] < args.min_agreement]
+    if failed:
+        # 只删除本次导出且未通过校验的模型，避免运行时误用；已存在的缓存不在此处删除
+        exported_dirs = {model_dir for _, _, model_dir, exported in failed if exported}
+        for model_dir in exported_dirs:
+            shutil.rmtree(model_dir, ignore_errors=True)
+        removed = "已删除本次导出的模型" if exported_dirs else "已有导出未被删除，可使用 --force 重新导出"
+        print(f"❌ 一致性校验失败 ({', '.join(label for _, label, _, _ in failed)} 平均余弦低于 {args.min_agreement})，{removed}。")
+        sys.exit(1)
+    print(f"✅ {args.backend} 编码器校验通过。设置环境变量 AGENT_ENCODER_BACKEND={args.backend} 即可启用。")
+
+
+def _ingest_batch(batch, topics, db_manager, classifier, doc_processor):
+    """对一批就绪文件执行入库：PDF 分类后统一写库再归档，图片整批编码
+
+    返回 (成功数, 失败的文件路径列表)，失败的文件仍留在投放目录，可重新排队重试。
+    """
+    papers = [p for p in batch if p.lower().endswith('.pdf')]
+    images = [p for p in batch if p.lower().endswith(IMAGE_EXTENSIONS)]
+    ok, failed = 0, []
+
+    if papers:
+        prepared = []
+        for path in papers:
+            try:
+                prepared.append(prepare_paper(path, topics, classifier, doc_processor))
+            except Exception as e:
+                print(f"❌ 处理 {path} 出错: {e}")
+                failed.append(path)
+        if prepared:
+            try:
+                committed = commit_papers(prepared, db_manager, doc_processor)
+            except Exception as e:
+                # 写库失败时文件仍留在投放目录，不会出现"已归档未入库"
+                print(f"❌ 批量写入文献库失败: {e}")
+                committed = []
+            ok += len(committed)
+            failed.extend(path for path, _, _ in prepared if path not in committed)
+
+    if images:
+        indexed = db_manager.add_images(images)
+        print(f"🖼️ 已索引 {len(indexed)}/{len(images)} 张新图片。")
+        ok += len(indexed)
+        failed.extend(path for path in images if path not in indexed)
+
+    return ok, failed
+
+
+def watch_folders(args):
+    """监听投放目录，新文件写完后即由常驻模型批量入库"""
+    for d in args.dirs:
+        if not os.path.isdir(d):
+            print(f"❌ 错误：找不到目录 {d}")
+            return
+
+    topics = [t.strip() for t in args.topics.split(",")] if args.topics else None
+    extensions = IMAGE_EXTENSIONS + ('.pdf',) if topics else IMAGE_EXTENSIONS
+
+    # 模型只在启动时加载一次，后续所有文件复用
+    doc_processor = DocumentProcessor(skip_references=not args.keep_references)
+    classifier = SemanticClassifier() if topics else None
+    db_manager = VectorDBManager()
+
+    watcher = FolderWatcher(
+        args.dirs, extensions,
+        debounce=args.debounce,
+        poll_interval=args.interval,
+        use_inotify=not args.polling,
+        include_existing=not args.new_only,
+        # 图片原地保存不会被移走：默认跳过库中已有且未修改的图片，--rescan 时全部重新索引
+        known=None if args.rescan else db_manager.indexed_images()
+    )
+    watcher.start()
+    print(f"👀 正在监听 ({watcher.mode}): {', '.join(args.dirs)}  按 Ctrl+C 退出")
+
+    started = time.monotonic()
+    last_stats = started
+    processed, failed = 0, 0
+    backlog = []
+    try:
+        while True:
+            backlog.extend(watcher.poll())
+            while backlog:
+                batch, backlog = backlog[:args.batch_size], backlog[args.batch_size:]
+                t0 = time.monotonic()
+                ok, bad = _ingest_batch(batch, topics, db_manager, classifier, doc_processor)
+                processed += ok
+                failed += len(bad)
+                # 失败的文件退避后重新排队，而不是等到文件被修改或进程重启
+                for path in bad:
+                    delay = watcher.requeue(path)
+                    print(f"🔁 {os.path.basename(path)} 将在 {delay:.0f}s 后重试")
+                print(f"⚡ 本批 {len(batch)} 个文件，耗时 {time.monotonic() - t0:.2f}s，"
+                      f"剩余待入库 {len(backlog)}")
+
+            now = time.monotonic()
+            if now - last_stats >= args.stats_interval:
+                elapsed = now - started
+                print(f"📊 已入库 {processed} | 失败 {failed} | "
+                      f"吞吐量 {processed / elapsed:.2f} 个/秒 | "
+                      f"队列深度 {watcher.queue_depth()} (去抖中) + {len(backlog)} (待入库)")
+                last_stats = now
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print(f"\n🛑 停止监听。共入库 {processed} 个文件，失败 {failed} 个。")
+        _print_chunk_stats(doc_processor)
+    finally:
+        watcher.stop()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Local AI Agent (Multi-modal)")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
@@ -143,11 +366,14 @@ def main():
     add_p = subparsers.add_parser("add_paper")
     add_p.add_argument("path", type=str)
     add_p.add_argument("--topics", type=str, required=True)
+    add_p.add_argument("--keep-references", action="store_true", help="Also index references and appendices")
 
     # 2. batch_process (批量文件夹)
     batch_p = subparsers.add_parser("batch_process")
     batch_p.add_argument("dir", type=str, help="Directory containing multiple PDFs")
     batch_p.add_argument("--topics", type=str, required=True)
+    batch_p.add_argument("--keep-references", action="store_true", help="Also index references and appendices")
+    batch_p.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
 
     # 3. search_paper
     search_p = subparsers.add_parser("search_paper")
@@ -157,11 +383,45 @@ def main():
     # 4. index_images
     idx_img_p = subparsers.add_parser("index_images")
     idx_img_p.add_argument("dir", type=str)
+    idx_img_p.add_argument("--batch-size", type=int, default=32)
+    idx_img_p.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
 
     # 5. search_image
     src_img_p = subparsers.add_parser("search_image")
     src_img_p.add_argument("query", type=str)
 
+    # 6. search_batch (批量搜索，JSONL 输出)
+    batch_s = subparsers.add_parser("search_batch")
+    batch_s.add_argument("queries", type=str, nargs="?", default="-", help="Query file, one per line ('-' = stdin)")
+    batch_s.add_argument("--type", type=str, choices=["paper", "image"], default="paper")
+    batch_s.add_argument("--k", type=int, default=3)
+    batch_s.add_argument("--batch-size", type=int, default=256)
+    batch_s.add_argument("--output", type=str, default=None, help="Write JSONL here instead of stdout")
+
+    # 7. watch (监听投放目录，持续入库)
+    watch_p = subparsers.add_parser("watch")
+    watch_p.add_argument("dirs", type=str, nargs="+", help="Drop folders for PDFs and/or images")
+    watch_p.add_argument("--topics", type=str, default=None, help="Required to ingest PDFs")
+    watch_p.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE_SECONDS)
+    watch_p.add_argument("--interval", type=float, default=WATCH_POLL_INTERVAL)
+    watch_p.add_argument("--batch-size", type=int, default=WATCH_BATCH_SIZE)
+    watch_p.add_argument("--stats-interval", type=float, default=WATCH_STATS_INTERVAL)
+    watch_p.add_argument("--polling", action="store_true", help="Force polling instead of inotify")
+    watch_p.add_argument("--new-only", action="store_true", help="Ignore files present at startup")
+    watch_p.add_argument("--rescan", action="store_true", help="Re-index images already in the image collection")
+    watch_p.add_argument("--keep-references", action="store_true", help="Also index references and appendices")
+
+    # 8. export_encoders (导出量化编码器并校验)
+    export_p = subparsers.add_parser("export_encoders")
+    export_p.add_argument("--backend", type=str, choices=["onnx", "torchscript"], default="onnx")
+    export_p.add_argument("--force", action="store_true", help="Re-export even if a cached model exists")
+    export_p.add_argument("--threads", type=int, default=ENCODER_NUM_THREADS, help="Intra-op threads (0 = default)")
+    export_p.add_argument("--batch-size", type=int, default=32)
+    export_p.add_argument("--image-dir", type=str, default="./test_data/images")
+    export_p.add_argument("--skip-check", action="store_true", help="Skip agreement check and benchmark")
+    export_p.add_argument("--min-agreement", type=float, default=ENCODER_MIN_AGREEMENT,
+                          help="Minimum mean cosine vs. the eager model")
+
     args = parser.parse_args()
 
     if args.command == "add_paper":
@@ -174,6 +434,12 @@ def main():
         index_images(args)
     elif args.command == "search_image":
         search_image(args)
+    elif args.command == "search_batch":
+        search_batch(args)
+    elif args.command == "watch":
+        watch_folders(args)
+    elif args.command == "export_encoders":
+        export_encoders(args)
     else:
         parser.print_help()
 
@@ -1,5 +1,6 @@
-from sentence_transformers import SentenceTransformer, util
-from modules.config import EMBEDDING_MODEL_PATH
+from sentence_transformers import util
+from modules.config import EMBEDDING_MODEL_PATH, ENCODER_BACKEND
+from modules.encoders import load_sentence_model
 import torch
 import re
 # import nltk
@@ -12,8 +13,8 @@ import re
 
 class SemanticClassifier:
     def __init__(self):
-        print(f"🔄 正在加载分类模型: {EMBEDDING_MODEL_PATH} ...")
-        self.model = SentenceTransformer(EMBEDDING_MODEL_PATH)
+        print(f"🔄 正在加载分类模型: {EMBEDDING_MODEL_PATH} (后端: {ENCODER_BACKEND}) ...")
+        self.model = load_sentence_model()
 
     def _clean_text(self, text):
         """
@@ -4,6 +4,7 @@ import os
 BASE_DIR = './agent'
 DOCS_DIR = os.path.join('./', "documents")
 DB_DIR = os.path.join('./', "db")
+JOURNAL_DIR = os.path.join(DB_DIR, "journals")  # 批处理预写日志 (断点续跑)
 
 # ===================================================
 # 模型配置
@@ -16,4 +17,31 @@ EMBEDDING_MODEL_PATH = os.path.join(BASE_DIR, "models", "AI-ModelScope", "all-Mi
 # 在 config.py 中添加 CLIP 模型用于图像和文本的跨模态匹配
 CLIP_MODEL_NAME = "clip-ViT-B-32"
 CLIP_MODEL_PATH = "./agent/models/models--openai--clip-vit-base-patch32/snapshots/3d74acf9a28c67741b2f4f2ea7635f0aaf6f0268"
-IMG_DIR = os.path.join('./', "images") # 存放图片的目录
\ No newline at end of file
+# 编码器推理后端: "torch" (默认, PyTorch eager)、"torchscript" 或 "onnx" (后两者为 int8 动态量化, 仅 CPU)
+# 优化后的模型首次使用时导出，缓存在 CLIP_MODEL_PATH / EMBEDDING_MODEL_PATH 同级的 "<路径>-<后端>-int8" 目录
+ENCODER_BACKEND = os.environ.get("AGENT_ENCODER_BACKEND", "torch")
+ENCODER_NUM_THREADS = int(os.environ.get("AGENT_ENCODER_THREADS", "0"))  # intra-op 线程数，0 表示使用库默认值
+ENCODER_MIN_AGREEMENT = 0.99  # export_encoders 校验：优化模型与 eager 模型的平均余弦相似度下限
+IMG_DIR = os.path.join('./', "images") # 存放图片的目录
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')  # 支持索引的图片格式
+
+# ===================================================
+# PDF 切片配置
+# ===================================================
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+SKIP_REFERENCES = True    # 跳过参考文献、附录、致谢等章节
+STRIP_BOILERPLATE = True  # 去除重复的页眉页脚、页码以及摘要之前的作者/单位信息
+# 命中以下标题 (忽略大小写与编号) 的章节不入库
+SKIPPED_SECTIONS = ("references", "bibliography", "appendix", "appendices",
+                    "supplementary material", "acknowledgment", "acknowledgement")
+
+# ===================================================
+# 监听目录 (watch) 配置
+# ===================================================
+WATCH_DEBOUNCE_SECONDS = 2.0  # 文件大小/修改时间需保持不变的秒数，避免读取未写完的文件
+WATCH_POLL_INTERVAL = 1.0     # 轮询模式的扫描间隔 (秒)，inotify 模式下用于检查去抖队列
+WATCH_BATCH_SIZE = 16         # 每批最多入库的文件数
+WATCH_STATS_INTERVAL = 30.0   # 打印吞吐量/队列深度统计的间隔 (秒)
+WATCH_RETRY_BACKOFF = 10.0    # 入库失败后首次重试的等待秒数，之后每次翻倍
+WATCH_RETRY_MAX_BACKOFF = 600.0
@@ -1,33 +1,198 @@
 import os
+import re
 import shutil
+from collections import Counter
+from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from modules.config import DOCS_DIR
+from modules.config import (DOCS_DIR, CHUNK_SIZE, CHUNK_OVERLAP, SKIP_REFERENCES, STRIP_BOILERPLATE,
+                            SKIPPED_SECTIONS)
+
+# 带编号的标题，例如 "3 Method"、"2.1 Model Architecture"、"IV. EXPERIMENTS"
+# 罗马数字必须带句点，避免 "V Mnih and K Kavukcuoglu" 这类作者缩写被当成标题
+NUMBERED_HEADING = re.compile(
+    r'^(?:(\d{1,2})((?:\.\d{1,2})*)\.?|([IVX]{1,5})\.)\s+([A-Z][A-Za-z\-,:&\' ]{2,60})$'
+)
+SENTENCE_CASE_MAX_WORDS = 4  # 非 Title Case / 全大写的编号标题最多允许的单词数
+MINOR_WORDS = {"a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "with", "via", "by", "at", "from", "is"}
+# 不带编号的常见标题 (忽略大小写匹配，之后再要求首字母大写或全大写)
+NAMED_HEADING = re.compile(
+    r'^(?:(\d{1,2})\.?\s+)?(abstract|introduction|related work|background|methods?|methodology|'
+    r'experiments?|results|discussion|conclusions?|references|bibliography|acknowledge?ments?|'
+    r'appendix(?:\s+[A-Z])?(?:[:.]\s*.{0,60})?|appendices|supplementary material)\s*:?$',
+    re.IGNORECASE
+)
+# IEEE / LNCS 等格式的摘要与正文在同一行，例如 "Abstract—We propose ..."、"Abstract. We ..."
+INLINE_ABSTRACT = re.compile(r'^(?:Abstract|ABSTRACT)\s*[—–\-.:]')
+ROMAN_NUMERALS = {'I': 1, 'V': 5, 'X': 10}
+PAGE_NUMBER = re.compile(r'^(?:page\s*)?\d{1,4}(?:\s*(?:/|of)\s*\d{1,4})?$', re.IGNORECASE)
+EDGE_LINES = 2  # 每页顶部/底部参与页眉页脚检测的行数
 
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, skip_references=SKIP_REFERENCES, strip_boilerplate=STRIP_BOILERPLATE):
+        self.skip_references = skip_references
+        self.strip_boilerplate = strip_boilerplate
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
         )
+        # 累计统计：结构化切片相比逐页通用切片节省的片段数
+        self.stats = {"papers": 0, "chunks": 0, "baseline_chunks": 0}
 
     def load_and_split(self, file_path):
         """读取 PDF 并切分为用于搜索的片段"""
         loader = PyPDFLoader(file_path)
         docs = loader.load()
-        splits = self.text_splitter.split_documents(docs)
+        sections = self._section_documents(docs)
+        # 扫描版或无法识别结构的 PDF 回退到逐页切分
+        splits = self.text_splitter.split_documents(sections or docs)
+
+        baseline = len(self.text_splitter.split_documents(docs))
+        self.stats["papers"] += 1
+        self.stats["chunks"] += len(splits)
+        self.stats["baseline_chunks"] += baseline
+        saved = baseline - len(splits)
+        print(f"✂️ 切片 {len(splits)} 个 (通用切分 {baseline} 个，节省 {saved} 个 / "
+              f"{saved / max(baseline, 1) * 100:.1f}%)")
         return splits, docs[0].page_content  # 返回切片用于存储，返回第一页内容用于分类
 
-    def move_file(self, file_path, category):
-        """将文件移动到对应的分类文件夹"""
-        target_dir = os.path.join(DOCS_DIR, category)
+    # ================= 结构化切片 =================
+
+    @staticmethod
+    def _normalize_edge_line(line):
+        """页眉页脚比较时忽略大小写与数字 (页码)"""
+        return re.sub(r'\d+', '#', line.strip().lower())
+
+    def _repeated_edge_lines(self, pages):
+        """找出在多数页面顶部/底部重复出现的页眉页脚"""
+        counter = Counter()
+        for lines in pages:
+            edges = lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+            counter.update({self._normalize_edge_line(l) for l in edges})
+        threshold = max(3, len(pages) // 2)
+        return {line for line, count in counter.items() if count >= threshold}
+
+    def _strip_edges(self, lines, repeated):
+        """去除一页首尾的页码与重复页眉页脚"""
+        def is_boilerplate(line):
+            return PAGE_NUMBER.match(line) or self._normalize_edge_line(line) in repeated
+
+        start, end = 0, len(lines)
+        while start < min(end, EDGE_LINES) and is_boilerplate(lines[start]):
+            start += 1
+        while end > max(start, len(lines) - EDGE_LINES) and is_boilerplate(lines[end - 1]):
+            end -= 1
+        return lines[start:end]
+
+    @staticmethod
+    def _section_number(label):
+        """一级章节编号转为整数，支持阿拉伯数字与罗马数字"""
+        if label.isdigit():
+            return int(label)
+        values = [ROMAN_NUMERALS[c] for c in label]
+        return sum(-v if i + 1 < len(values) and v < values[i + 1] else v for i, v in enumerate(values))
+
+    @staticmethod
+    def _looks_like_title(title):
+        """Title Case、全大写或很短的句首大写标题；"The proposed method is Good" 这类正文句子不算"""
+        words = title.split()
+        if len(words) > 8:
+            return False
+        if title.isupper() or len(words) <= SENTENCE_CASE_MAX_WORDS:
+            return True
+        return all(w[0].isupper() or w.lower() in MINOR_WORDS for w in words)
+
+    def _match_heading(self, line):
+        """识别章节标题，返回 (标题, 是否为带编号标题, 一级章节编号, 是否为子章节)
+
+        子章节 (如 "2.1") 返回的编号是其所属的一级章节编号。
+        """
+        if len(line) > 70:
+            return None, False, None, False
+        named = NAMED_HEADING.match(line)
+        # 正文换行后单独成行的 "references"、"results" 等小写单词不算标题
+        if named and (named.group(2)[0].isupper() or line.isupper()):
+            number = int(named.group(1)) if named.group(1) else None
+            return named.group(2).strip(), False, number, False
+        numbered = NUMBERED_HEADING.match(line)
+        if numbered and self._looks_like_title(numbered.group(4).strip()):
+            label = numbered.group(1) or numbered.group(3)
+            return numbered.group(4).strip(), True, self._section_number(label), bool(numbered.group(2))
+        return None, False, None, False
+
+    @staticmethod
+    def _accept_numbered(number, subsection, last_number, skipping):
+        """编号标题需与已有章节顺序衔接，否则视为正文 (如参考文献条目、以数字开头的句子)
+
+        跳过参考文献等章节时，只有紧接上一个一级编号的章节才结束跳过
+        (说明之前的跳过标题是误判，或参考文献后还有正文)。
+        """
+        if subsection:
+            return not skipping and number == last_number
+        if skipping:
+            return number == last_number + 1
+        return last_number < number <= last_number + 2
+
+    @staticmethod
+    def _is_skipped(section):
+        return section.lower().startswith(SKIPPED_SECTIONS)
+
+    def _section_documents(self, docs):
+        """按章节重新组织页面文本，返回带 page/section 元数据的 Document 列表"""
+        pages = [[l.strip() for l in doc.page_content.splitlines() if l.strip()] for doc in docs]
+        section = "front matter"
+        if self.strip_boilerplate:
+            repeated = self._repeated_edge_lines(pages) if len(pages) >= 3 else set()
+            pages = [self._strip_edges(lines, repeated) for lines in pages]
+
+            # 摘要之前通常是标题、作者与单位信息
+            for i, line in enumerate(pages[0] if pages else []):
+                heading = self._match_heading(line)[0]
+                if (heading and heading.lower() == "abstract") or INLINE_ABSTRACT.match(line):
+                    pages[0] = pages[0][i:]
+                    section = "Abstract"
+                    break
+
+        sections = []
+        skipping, last_number = False, 0
+        for doc, lines in zip(docs, pages):
+            buffer = []
+            for line in lines:
+                heading, numbered, number, subsection = self._match_heading(line)
+                if not heading or (numbered and not self._accept_numbered(number, subsection, last_number, skipping)):
+                    buffer.append(line)
+                    continue
+                if number is not None and not subsection:
+                    last_number = number
+                if not skipping:
+                    self._append_section(sections, doc, section, buffer)
+                buffer = []
+                section = heading
+                skipping = self.skip_references and self._is_skipped(heading)
+                buffer.append(line)
+            if not skipping:
+                self._append_section(sections, doc, section, buffer)
+        return sections
+
+    @staticmethod
+    def _append_section(sections, page_doc, section, lines):
+        if lines:
+            metadata = dict(page_doc.metadata, section=section)
+            sections.append(Document(page_content="\n".join(lines), metadata=metadata))
+
+    @staticmethod
+    def target_path(file_path, category):
+        """文件归档后的路径 (不执行移动)"""
+        return os.path.join(DOCS_DIR, category, os.path.basename(file_path))
+
+    def move_file(self, file_path, category, target_path=None):
+        """将文件移动到对应的分类文件夹；target_path 可指定归档文件名 (如同名冲突时的新名字)"""
+        target_path = target_path or self.target_path(file_path, category)
+        target_dir = os.path.dirname(target_path)
         if not os.path.exists(target_dir):
             os.makedirs(target_dir)
 
-        filename = os.path.basename(file_path)
-        target_path = os.path.join(target_dir, filename)
-
         shutil.move(file_path, target_path)
         print(f"📂 文件已归档至: {target_path}")
-        return target_path
\ No newline at end of file
+        return target_path
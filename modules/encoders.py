@@ -0,0 +1,326 @@
+import os
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from langchain_core.embeddings import Embeddings
+from transformers import AutoModel, AutoTokenizer, CLIPModel, CLIPProcessor
+from modules.config import CLIP_MODEL_PATH, EMBEDDING_MODEL_PATH, ENCODER_BACKEND, ENCODER_NUM_THREADS
+
+BACKENDS = ("torch", "torchscript", "onnx")
+MINILM_MAX_LENGTH = 256  # all-MiniLM-L6-v2 的 max_seq_length
+CLIP_MAX_LENGTH = 77     # CLIP 文本编码器的最大 token 数
+
+
+def configure_threads(num_threads=ENCODER_NUM_THREADS):
+    """显式设置 PyTorch 的 intra-op 线程数 (0 表示保持默认)"""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+
+def optimized_model_dir(model_path, backend):
+    """优化模型的缓存目录：与原模型目录同级"""
+    return f"{os.path.normpath(model_path)}-{backend}-int8"
+
+
+def _model_file(model_dir, name, backend):
+    return os.path.join(model_dir, f"{name}.{'onnx' if backend == 'onnx' else 'pt'}")
+
+
+# ================= 导出用的编码器包装 =================
+
+class _ClipImageModule(nn.Module):
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, pixel_values):
+        features = self.clip_model.get_image_features(pixel_values=pixel_values)
+        return F.normalize(features, dim=-1)
+
+
+class _ClipTextModule(nn.Module):
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, input_ids, attention_mask):
+        features = self.clip_model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+        return F.normalize(features, dim=-1)
+
+
+class _SentenceModule(nn.Module):
+    """MiniLM + mean pooling + 归一化，与 sentence-transformers 的推理结果保持一致"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        token_embeddings = self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+        mask = attention_mask.unsqueeze(-1).to(token_embeddings.dtype)
+        pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return F.normalize(pooled, dim=-1)
+
+
+def _text_padding(backend, max_length):
+    """TorchScript 按固定长度 trace，导出与推理都必须补齐到 max_length；其余后端按批内最长动态补齐"""
+    if backend == "torchscript":
+        return {"padding": "max_length", "truncation": True, "max_length": max_length}
+    return {"padding": True, "truncation": True, "max_length": max_length}
+
+
+def _export_module(module, example_inputs, input_names, target_path, backend):
+    """将包装好的模块导出为 int8 动态量化的 TorchScript / ONNX 文件"""
+    module.eval()
+    if backend == "torchscript":
+        quantized = torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+        with torch.no_grad():
+            traced = torch.jit.trace(quantized, tuple(example_inputs), strict=False)
+        torch.jit.save(traced, target_path)
+        return
+
+    try:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError:
+        raise ImportError("ONNX 后端需要安装 onnx 与 onnxruntime: pip install onnx onnxruntime")
+
+    fp32_path = target_path.replace(".onnx", ".fp32.onnx")
+    dynamic_axes = {name: {0: "batch"} for name in input_names}
+    for name in input_names:
+        if name != "pixel_values":
+            dynamic_axes[name][1] = "sequence"
+    dynamic_axes["embeddings"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            module, tuple(example_inputs), fp32_path,
+            input_names=input_names,
+            output_names=["embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17
+        )
+    quantize_dynamic(fp32_path, target_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+
+
+def export_clip(backend, force=False):
+    """导出 CLIP 图像/文本编码器，返回 (缓存目录, 本次是否重新导出)"""
+    model_dir = optimized_model_dir(CLIP_MODEL_PATH, backend)
+    image_path = _model_file(model_dir, "image_encoder", backend)
+    text_path = _model_file(model_dir, "text_encoder", backend)
+    if not force and os.path.exists(image_path) and os.path.exists(text_path):
+        return model_dir, False
+
+    print(f"🛠️ 正在导出 CLIP 编码器 ({backend}, int8) 至: {model_dir}")
+    os.makedirs(model_dir, exist_ok=True)
+    clip_model = CLIPModel.from_pretrained(CLIP_MODEL_PATH).eval()
+    processor = CLIPProcessor.from_pretrained(CLIP_MODEL_PATH, use_fast=True)
+
+    size = processor.image_processor.crop_size
+    pixel_values = torch.zeros(2, 3, size["height"], size["width"])
+    _export_module(_ClipImageModule(clip_model), [pixel_values], ["pixel_values"], image_path, backend)
+
+    tokens = processor(text=["a photo of a cat", "a photo of a dog on the beach"],
+                       return_tensors="pt", **_text_padding(backend, CLIP_MAX_LENGTH))
+    _export_module(_ClipTextModule(clip_model), [tokens["input_ids"], tokens["attention_mask"]],
+                   ["input_ids", "attention_mask"], text_path, backend)
+    return model_dir, True
+
+
+def export_sentence(backend, force=False):
+    """导出 MiniLM 句向量编码器，返回 (缓存目录, 本次是否重新导出)"""
+    model_dir = optimized_model_dir(EMBEDDING_MODEL_PATH, backend)
+    target_path = _model_file(model_dir, "sentence_encoder", backend)
+    if not force and os.path.exists(target_path):
+        return model_dir, False
+
+    print(f"🛠️ 正在导出 MiniLM 编码器 ({backend}, int8) 至: {model_dir}")
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_PATH)
+    model = AutoModel.from_pretrained(EMBEDDING_MODEL_PATH).eval()
+    tokens = tokenizer(["a sample sentence", "another longer sample sentence for tracing"],
+                       return_tensors="pt", **_text_padding(backend, MINILM_MAX_LENGTH))
+    _export_module(_SentenceModule(model), [tokens["input_ids"], tokens["attention_mask"]],
+                   ["input_ids", "attention_mask"], target_path, backend)
+    return model_dir, True
+
+
+# ================= 推理 =================
+
+class _TorchRunner:
+    """运行 eager 或 TorchScript 模块，输入输出均为 numpy"""
+
+    def __init__(self, module, device="cpu"):
+        self.module = module
+        self.device = device
+
+    def __call__(self, **inputs):
+        with torch.no_grad():
+            tensors = [torch.as_tensor(v).to(self.device) for v in inputs.values()]
+            return self.module(*tensors).cpu().numpy()
+
+
+class _OnnxRunner:
+    def __init__(self, model_file, num_threads):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("ONNX 后端需要安装 onnxruntime: pip install onnxruntime")
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, **inputs):
+        feed = {k: np.asarray(v) for k, v in inputs.items()}
+        return self.session.run(None, feed)[0]
+
+
+def _load_runner(model_dir, name, backend, num_threads):
+    model_file = _model_file(model_dir, name, backend)
+    if not os.path.exists(model_file):
+        # 运行时不自动导出：导出必须经过 export_encoders 的一致性校验
+        raise FileNotFoundError(f"未找到 {backend} 优化模型 {model_file}，"
+                                f"请先运行: python main.py export_encoders --backend {backend}")
+    if backend == "onnx":
+        return _OnnxRunner(model_file, num_threads)
+    return _TorchRunner(torch.jit.load(model_file, map_location="cpu"))
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的编码器后端: {backend}，可选: {', '.join(BACKENDS)}")
+
+
+class ClipEncoder:
+    """CLIP 图像/文本编码器，输出 L2 归一化后的向量"""
+
+    def __init__(self, backend=ENCODER_BACKEND, device="cpu", num_threads=ENCODER_NUM_THREADS):
+        _check_backend(backend)
+        configure_threads(num_threads)
+        self.backend = backend
+        self.processor = CLIPProcessor.from_pretrained(CLIP_MODEL_PATH, use_fast=True)
+
+        if backend == "torch":
+            clip_model = CLIPModel.from_pretrained(CLIP_MODEL_PATH).to(device).eval()
+            self.image_runner = _TorchRunner(_ClipImageModule(clip_model), device)
+            self.text_runner = _TorchRunner(_ClipTextModule(clip_model), device)
+        else:
+            model_dir = optimized_model_dir(CLIP_MODEL_PATH, backend)
+            self.image_runner = _load_runner(model_dir, "image_encoder", backend, num_threads)
+            self.text_runner = _load_runner(model_dir, "text_encoder", backend, num_threads)
+
+    def encode_images(self, images):
+        inputs = self.processor(images=images, return_tensors="np")
+        return self.image_runner(pixel_values=inputs["pixel_values"].astype(np.float32))
+
+    def encode_texts(self, texts):
+        inputs = self.processor(text=texts, return_tensors="np", **_text_padding(self.backend, CLIP_MAX_LENGTH))
+        return self.text_runner(input_ids=inputs["input_ids"].astype(np.int64),
+                                attention_mask=inputs["attention_mask"].astype(np.int64))
+
+
+class SentenceEncoder:
+    """优化后端的 MiniLM 编码器，encode 接口与 SentenceTransformer 保持一致"""
+
+    def __init__(self, backend=ENCODER_BACKEND, num_threads=ENCODER_NUM_THREADS):
+        _check_backend(backend)
+        configure_threads(num_threads)
+        self.backend = backend
+        if backend == "torch":
+            raise ValueError("torch 后端请直接使用 SentenceTransformer")
+        self.tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_PATH)
+        model_dir = optimized_model_dir(EMBEDDING_MODEL_PATH, backend)
+        self.runner = _load_runner(model_dir, "sentence_encoder", backend, num_threads)
+
+    def encode(self, sentences, batch_size=32, convert_to_tensor=False):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        chunks = []
+        for start in range(0, len(sentences), batch_size):
+            inputs = self.tokenizer(sentences[start:start + batch_size], return_tensors="np",
+                                    **_text_padding(self.backend, MINILM_MAX_LENGTH))
+            chunks.append(self.runner(input_ids=inputs["input_ids"].astype(np.int64),
+                                      attention_mask=inputs["attention_mask"].astype(np.int64)))
+        embeddings = np.concatenate(chunks) if chunks else np.zeros((0, 384), dtype=np.float32)
+
+        if single:
+            embeddings = embeddings[0]
+        return torch.from_numpy(embeddings) if convert_to_tensor else embeddings
+
+
+class SentenceEncoderEmbeddings(Embeddings):
+    """把 SentenceEncoder 适配为 LangChain 的 Embeddings 接口"""
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+
+    def embed_documents(self, texts):
+        return self.encoder.encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.encoder.encode(text).tolist()
+
+
+def load_sentence_model(backend=ENCODER_BACKEND):
+    """分类器使用的句向量模型：torch 后端保持原生 SentenceTransformer"""
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        configure_threads()
+        return SentenceTransformer(EMBEDDING_MODEL_PATH)
+    return SentenceEncoder(backend)
+
+
+def load_doc_embeddings(backend=ENCODER_BACKEND):
+    """文献库使用的 LangChain Embeddings"""
+    if backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        configure_threads()
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_PATH)
+    return SentenceEncoderEmbeddings(SentenceEncoder(backend))
+
+
+# ================= 一致性校验与性能对比 =================
+
+def _agreement(reference, candidate):
+    """两组已归一化向量逐行的余弦相似度"""
+    cos = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1))
+    return float(cos.mean()), float(cos.min())
+
+
+def _throughput(fn, items, batch_size):
+    fn(items[:batch_size])  # 预热
+    start = time.perf_counter()
+    for i in range(0, len(items), batch_size):
+        fn(items[i:i + batch_size])
+    return len(items) / (time.perf_counter() - start)
+
+
+def compare_backends(backend, images, sentences, batch_size=32, num_threads=ENCODER_NUM_THREADS):
+    """对比 eager 模型与优化后端：向量一致性 (余弦) 与吞吐量"""
+    _check_backend(backend)
+    from sentence_transformers import SentenceTransformer
+
+    eager_clip = ClipEncoder("torch", num_threads=num_threads)
+    fast_clip = ClipEncoder(backend, num_threads=num_threads)
+    eager_st = SentenceTransformer(EMBEDDING_MODEL_PATH, device="cpu")
+    fast_st = SentenceEncoder(backend, num_threads=num_threads)
+    eager_encode = lambda s: eager_st.encode(s, batch_size=batch_size)
+
+    report = {"backend": backend, "threads": torch.get_num_threads()}
+    if images:
+        report["image_agreement"] = _agreement(eager_clip.encode_images(images[:batch_size]),
+                                               fast_clip.encode_images(images[:batch_size]))
+        report["images_per_sec"] = (_throughput(eager_clip.encode_images, images, batch_size),
+                                    _throughput(fast_clip.encode_images, images, batch_size))
+    report["clip_text_agreement"] = _agreement(eager_clip.encode_texts(sentences[:batch_size]),
+                                               fast_clip.encode_texts(sentences[:batch_size]))
+    report["sentence_agreement"] = _agreement(eager_encode(sentences), fast_st.encode(sentences))
+    report["sentences_per_sec"] = (_throughput(eager_encode, sentences, batch_size),
+                                   _throughput(fast_st.encode, sentences, batch_size))
+    return report
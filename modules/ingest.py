@@ -0,0 +1,114 @@
+import os
+import filecmp
+import hashlib
+
+
+def prepare_paper(file_path, topics, classifier, doc_processor):
+    """切片并分类单份 PDF (不移动文件)，返回 (原路径, 类别, 切片)"""
+    print(f"🔄 正在处理: {os.path.basename(file_path)} ...")
+    # 读取并切片
+    splits, first_page_text = doc_processor.load_and_split(file_path)
+
+    # 语义分类
+    category = classifier.classify_paper(first_page_text, topics)
+    print(f"✅ 归类结果: [{category}]")
+    return file_path, category, splits
+
+
+def chunk_ids(target_path, count):
+    """由归档路径生成固定的片段 id，重跑时覆盖写入而不产生重复片段"""
+    digest = hashlib.sha1(os.path.abspath(target_path).encode("utf-8")).hexdigest()[:16]
+    return [f"{digest}-{i}" for i in range(count)]
+
+
+def unique_target(file_path, category, doc_processor, claimed):
+    """确定归档路径：同一批内已占用、或已存在且内容不同的同名文件，改用 "name (n).pdf"
+
+    已归档的同一份文件 (内容相同) 重新投放时沿用原路径，覆盖写入它的片段。
+    """
+    target_path = doc_processor.target_path(file_path, category)
+    stem, ext = os.path.splitext(target_path)
+    n = 1
+    while target_path in claimed or (
+            os.path.exists(target_path) and not filecmp.cmp(file_path, target_path, shallow=False)):
+        target_path = f"{stem} ({n}){ext}"
+        n += 1
+    claimed.add(target_path)
+    return target_path
+
+
+def _rollback(db_manager, ids, snapshot):
+    """删除本次新写入的片段，并恢复被覆盖的旧片段"""
+    restored = set(snapshot["ids"])
+    db_manager.delete_documents([i for i in ids if i not in restored])
+    db_manager.restore_documents(snapshot)
+
+
+def commit_papers(prepared, db_manager, doc_processor, journal=None):
+    """先写向量库、再移动文件；移动失败时回滚该文件的片段，返回成功归档的原文件路径列表
+
+    任一步骤中断时，文件要么仍在源目录 (可直接重跑)，要么已入库且在日志中标记为 indexed (可续跑完成移动)。
+    """
+    entries, all_splits, all_ids = [], [], []
+    claimed = set()
+    for file_path, category, splits in prepared:
+        target_path = unique_target(file_path, category, doc_processor, claimed)
+        # 元数据直接指向归档后的路径，入库成功后再移动文件
+        for split in splits:
+            split.metadata['source'] = target_path
+            split.metadata['category'] = category
+        ids = chunk_ids(target_path, len(splits))
+        # 写入前保存将被覆盖的旧片段 (用于回滚)，并记录该路径已有的全部片段 (成功后清理多余的旧片段)
+        snapshot = db_manager.get_documents(ids)
+        existing = set(db_manager.document_ids(target_path))
+        entries.append((file_path, category, target_path, ids, existing, snapshot))
+        all_splits.extend(splits)
+        all_ids.extend(ids)
+
+    if all_splits:
+        try:
+            db_manager.add_documents(all_splits, ids=all_ids)
+        except Exception:
+            # 写库中途失败：撤销可能已写入的部分，文件仍留在源目录
+            for _, _, _, ids, _, snapshot in entries:
+                _rollback(db_manager, ids, snapshot)
+            raise
+
+    committed = []
+    for file_path, category, target_path, ids, existing, snapshot in entries:
+        if journal:
+            journal.record(file_path, "indexed", category=category, target=target_path, chunks=len(ids))
+        try:
+            doc_processor.move_file(file_path, category, target_path=target_path)
+        except Exception as e:
+            print(f"❌ 归档 {file_path} 失败，回滚本次写入的片段: {e}")
+            _rollback(db_manager, ids, snapshot)
+            if journal:
+                journal.record(file_path, "failed", error=str(e))
+            continue
+        # 同一文件重新切分后片段变少时，删除不再属于当前文件的旧片段
+        db_manager.delete_documents(sorted(existing - set(ids)))
+        if journal:
+            journal.record(file_path, "done", category=category, target=target_path)
+        committed.append(file_path)
+    return committed
+
+
+def finish_interrupted_moves(journal, db_manager, doc_processor):
+    """续跑时补完上次已入库但未完成移动的文件"""
+    for file_path, record in journal.entries("indexed"):
+        target_path = record["target"]
+        try:
+            if os.path.exists(file_path):
+                doc_processor.move_file(file_path, record["category"], target_path=target_path)
+            elif not os.path.exists(target_path):
+                raise FileNotFoundError("源文件与归档文件均不存在")
+            # 与正常提交一致：删除该归档路径下不属于本次切片的旧片段 (旧版日志未记录片段数时跳过)
+            if "chunks" in record:
+                ids = set(chunk_ids(target_path, record["chunks"]))
+                db_manager.delete_documents(sorted(set(db_manager.document_ids(target_path)) - ids))
+        except Exception as e:
+            print(f"❌ 补完归档 {file_path} 失败: {e}")
+            journal.record(file_path, "failed", error=str(e))
+            continue
+        journal.record(file_path, "done", category=record["category"], target=target_path)
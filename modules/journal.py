@@ -0,0 +1,68 @@
+import os
+import json
+import time
+import hashlib
+from modules.config import JOURNAL_DIR
+
+
+class BatchJournal:
+    """追加写入的 JSONL 预写日志，记录批处理中每个文件完成到的阶段
+
+    每条记录写入后立即 fsync，进程被杀时最多丢失正在写的最后一行；
+    使用 resume=True 打开时会回放日志，得到每个文件最近一次的状态。
+    """
+
+    def __init__(self, kind, source_dir, resume=False, journal_dir=JOURNAL_DIR):
+        os.makedirs(journal_dir, exist_ok=True)
+        # 每个 (任务类型, 源目录) 对应一份日志
+        digest = hashlib.sha1(os.path.abspath(source_dir).encode("utf-8")).hexdigest()[:12]
+        self.path = os.path.join(journal_dir, f"{kind}-{digest}.jsonl")
+        self.state = {}
+
+        if resume and os.path.exists(self.path):
+            with open(self.path, "rb+") as f:
+                data = f.read()
+                # 崩溃时写了一半的最后一行：截断到最后一个换行符，避免后续追加的记录接在残行后面
+                end = data.rfind(b"\n") + 1
+                if end != len(data):
+                    f.truncate(end)
+            for line in data[:end].decode("utf-8").splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.state[record["file"]] = record
+            print(f"📒 从断点恢复: {self.path} ({len(self.state)} 个文件已有记录)")
+            self._fh = open(self.path, "a", encoding="utf-8")
+        else:
+            self._fh = open(self.path, "w", encoding="utf-8")
+
+    def stage(self, file_path):
+        """文件最近一次完成的阶段，没有记录时返回 None"""
+        record = self.state.get(os.path.abspath(file_path))
+        return record["stage"] if record else None
+
+    def entries(self, stage):
+        """返回处于指定阶段的 (文件, 记录) 列表"""
+        return [(f, r) for f, r in self.state.items() if r["stage"] == stage]
+
+    def record(self, file_path, stage, **extra):
+        self.record_many([file_path], stage, **extra)
+
+    def record_many(self, file_paths, stage, **extra):
+        """批量写入同一阶段的记录，只 fsync 一次"""
+        for file_path in file_paths:
+            record = dict(extra, file=os.path.abspath(file_path), stage=stage, time=time.time())
+            self.state[record["file"]] = record
+            self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
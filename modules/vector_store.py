@@ -1,29 +1,30 @@
 import os
+import hashlib
 import torch
 import chromadb
 from PIL import Image
-from transformers import CLIPModel, CLIPProcessor
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from modules.config import DB_DIR, EMBEDDING_MODEL_PATH, CLIP_MODEL_PATH
+from langchain_core.documents import Document
+from modules.config import DB_DIR, EMBEDDING_MODEL_PATH, ENCODER_BACKEND
+from modules.encoders import ClipEncoder, load_doc_embeddings
 
 
 class VectorDBManager:
     def __init__(self):
-        # 1. 检查并设置设备 (GPU/CPU)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"💻 使用设备: {self.device}")
+        # 1. 检查并设置设备 (GPU/CPU)，量化后端 (torchscript/onnx) 仅支持 CPU
+        if ENCODER_BACKEND == "torch" and torch.cuda.is_available():
+            self.device = "cuda"
+        else:
+            self.device = "cpu"
+        print(f"💻 使用设备: {self.device} | 编码器后端: {ENCODER_BACKEND}")
 
         # 2. 初始化文献 Embedding 模型 (纯文本)
         print(f"🔄 正在加载文档 Embedding 模型: {os.path.basename(EMBEDDING_MODEL_PATH)}...")
-        self.doc_embedder = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_PATH)
+        self.doc_embedder = load_doc_embeddings()
 
-        # 3. 初始化原生 CLIP 模型 (多模态)
-        print(f"🔄 正在通过 Transformers 加载 CLIP 模型...")
-
-        self.clip_model = CLIPModel.from_pretrained(CLIP_MODEL_PATH).to(self.device)
-        # self.clip_processor = CLIPProcessor.from_pretrained(CLIP_MODEL_PATH)
-        self.clip_processor = CLIPProcessor.from_pretrained(CLIP_MODEL_PATH, use_fast=True)
+        # 3. 初始化 CLIP 编码器 (多模态)
+        print(f"🔄 正在加载 CLIP 编码器...")
+        self.clip_encoder = ClipEncoder(device=self.device)
 
         # 4. 初始化 ChromaDB
         self.client = chromadb.PersistentClient(path=DB_DIR)
@@ -45,49 +46,94 @@ class VectorDBManager:
         try:
             image = Image.open(img_path).convert("RGB")
 
-            # 使用 CLIPProcessor 预处理图像并生成 Embedding
-            with torch.no_grad():
-                inputs = self.clip_processor(images=image, return_tensors="pt").to(self.device)
-                image_features = self.clip_model.get_image_features(**inputs)
-                # 归一化特征向量
-                image_features /= image_features.norm(dim=-1, keepdim=True)
-                img_embedding = image_features.cpu().numpy().flatten().tolist()
+            # 生成归一化后的图像 Embedding
+            img_embedding = self.clip_encoder.encode_images([image])[0].tolist()
 
-            self.image_col.add(
+            self._drop_legacy_images([img_path])
+            self.image_col.upsert(
                 embeddings=[img_embedding],
                 documents=[img_path],
-                metadatas=[{"file_path": img_path}],
-                ids=[os.path.basename(img_path)]
+                metadatas=[self._image_metadata(img_path)],
+                ids=[self._image_id(img_path)]
             )
             return True
         except Exception as e:
             print(f"❌ 图片处理失败 {img_path}: {e}")
             return False
 
+    @staticmethod
+    def _image_id(img_path):
+        """由绝对路径生成图片 id，不同子目录下的同名图片互不覆盖"""
+        return hashlib.sha1(os.path.abspath(img_path).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _image_metadata(img_path):
+        # 记录修改时间，watch 启动时据此跳过未变化的已索引图片
+        return {"file_path": img_path, "mtime": os.path.getmtime(img_path)}
+
+    def _drop_legacy_images(self, img_paths):
+        """删除旧版本以文件名为 id 写入的同一图片，避免换用路径 id 后出现重复结果"""
+        targets = {os.path.abspath(p) for p in img_paths}
+        legacy = self.image_col.get(ids=list({os.path.basename(p) for p in img_paths}), include=["metadatas"])
+        stale = [i for i, meta in zip(legacy["ids"], legacy["metadatas"])
+                 if meta and os.path.abspath(meta.get("file_path", "")) in targets]
+        if stale:
+            self.image_col.delete(ids=stale)
+
+    def indexed_images(self):
+        """返回已入库图片的 {绝对路径: 修改时间}，旧版本写入的记录没有修改时间 (None)"""
+        records = self.image_col.get(include=["metadatas"])
+        return {os.path.abspath(meta["file_path"]): meta.get("mtime")
+                for meta in records["metadatas"] if meta and meta.get("file_path")}
+
+    def add_images(self, img_paths, batch_size=32):
+        """批量生成图像 Embedding 并存入库，返回成功入库的路径列表"""
+        img_paths = list(dict.fromkeys(img_paths))  # 同一路径只保留一次，避免一批内出现重复 id
+        indexed = []
+        for start in range(0, len(img_paths), batch_size):
+            images, paths = [], []
+            for img_path in img_paths[start:start + batch_size]:
+                try:
+                    images.append(Image.open(img_path).convert("RGB"))
+                    paths.append(img_path)
+                except Exception as e:
+                    print(f"❌ 图片读取失败 {img_path}: {e}")
+            if not images:
+                continue
+
+            try:
+                # 一次前向计算整批图片，避免逐张调用模型
+                embeddings = self.clip_encoder.encode_images(images).tolist()
+
+                # upsert 保证同一张图片重复索引时不会报错
+                self._drop_legacy_images(paths)
+                self.image_col.upsert(
+                    embeddings=embeddings,
+                    documents=paths,
+                    metadatas=[self._image_metadata(p) for p in paths],
+                    ids=[self._image_id(p) for p in paths]
+                )
+                indexed.extend(paths)
+            except Exception as e:
+                print(f"❌ 批量图片处理失败 ({len(paths)} 张): {e}")
+        return indexed
+
+    @staticmethod
+    def _optimize_image_query(query_text):
+        """优化提示词：如果用户没输入 a photo of，我们自动补上
+        这样可以更好地激活 CLIP 在预训练时学到的视觉特征"""
+        if not query_text.lower().startswith("a photo of"):
+            return f"a photo of a {query_text}"
+        return query_text
+
     def search_images(self, query_text, k=3):
         """以文搜图：带有 Prompt Template 优化的检索"""
         try:
-            # 1. 优化提示词：如果用户没输入 a photo of，我们自动补上
-            # 这样可以更好地激活 CLIP 在预训练时学到的视觉特征
-            if not query_text.lower().startswith("a photo of"):
-                optimized_query = f"a photo of a {query_text}"
-            else:
-                optimized_query = query_text
-
+            optimized_query = self._optimize_image_query(query_text)
             print(f"🪄 优化后的 Query: '{optimized_query}'")
 
-            with torch.no_grad():
-                # 使用 CLIPProcessor 处理优化后的搜索文本
-                inputs = self.clip_processor(
-                    text=[optimized_query],
-                    return_tensors="pt",
-                    padding=True
-                ).to(self.device)
-
-                text_features = self.clip_model.get_text_features(**inputs)
-                # 归一化
-                text_features /= text_features.norm(dim=-1, keepdim=True)
-                query_embedding = text_features.cpu().numpy().flatten().tolist()
+            # 编码优化后的搜索文本 (已归一化)
+            query_embedding = self.clip_encoder.encode_texts([optimized_query])[0].tolist()
 
             results = self.image_col.query(
                 query_embeddings=[query_embedding],
@@ -105,6 +151,15 @@ class VectorDBManager:
         except Exception as e:
             print(f"❌ 图像检索失败: {e}")
             return []
+
+    def search_images_batch(self, queries, k=3, batch_size=256):
+        """批量以文搜图：每批查询一次前向编码 + 一次多查询检索，按输入顺序逐条产出结果列表"""
+        for start in range(0, len(queries), batch_size):
+            chunk = [self._optimize_image_query(q) for q in queries[start:start + batch_size]]
+            embeddings = self.clip_encoder.encode_texts(chunk).tolist()
+            results = self.image_col.query(query_embeddings=embeddings, n_results=k)
+            for paths, distances in zip(results['documents'], results['distances']):
+                yield [{"path": p, "score": d} for p, d in zip(paths, distances)]
     # def search_images(self, query_text, k=3):
     #     """以文搜图：通过 CLIP 文本分支检索图像"""
     #     try:
@@ -136,11 +191,54 @@ class VectorDBManager:
 
     # ================= 文献管理模块 (2.1) =================
 
-    def add_documents(self, documents):
-        """将 PDF 切片存入文档库"""
-        self.paper_db.add_documents(documents)
+    def add_documents(self, documents, ids=None):
+        """将 PDF 切片存入文档库；传入固定 ids 时重复写入会覆盖而不是产生重复片段"""
+        self.paper_db.add_documents(documents, ids=ids)
         print(f"✅ 已将 {len(documents)} 个文献片段存入数据库。")
 
+    def document_ids(self, source):
+        """返回某个文件 (按 source 元数据) 已入库的全部片段 id"""
+        return self.paper_db.get(where={"source": source}, include=[])["ids"]
+
+    def delete_documents(self, ids):
+        """按 id 删除文献片段 (用于回滚)"""
+        if ids:
+            self.paper_db.delete(ids=ids)
+
+    def get_documents(self, ids):
+        """读取指定 id 的片段 (含向量)，作为覆盖写入前的快照；不存在的 id 不会出现在结果中"""
+        collection = self.client.get_collection("paper_collection")
+        return collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+
+    def restore_documents(self, snapshot):
+        """把 get_documents 得到的快照原样写回 (用于回滚被覆盖的片段)"""
+        if len(snapshot["ids"]):
+            collection = self.client.get_collection("paper_collection")
+            collection.upsert(ids=snapshot["ids"], documents=snapshot["documents"],
+                              metadatas=snapshot["metadatas"], embeddings=snapshot["embeddings"])
+
     def search_papers(self, query, k=3):
         """语义搜索文献"""
-        return self.paper_db.similarity_search(query, k=k)
\ No newline at end of file
+        return self.paper_db.similarity_search(query, k=k)
+
+    def _embed_queries(self, queries):
+        """批量编码查询，结果与 search_papers 内部使用的 embed_query 保持一致"""
+        # 默认配置下 embed_query 等价于对单条文本调用 embed_documents；
+        # 若配置了专门的查询编码参数 (query_encode_kwargs)，则逐条走 embed_query，避免单条与批量结果不一致
+        if getattr(self.doc_embedder, "query_encode_kwargs", None):
+            return [self.doc_embedder.embed_query(q) for q in queries]
+        return self.doc_embedder.embed_documents(queries)
+
+    def search_papers_batch(self, queries, k=3, batch_size=256):
+        """批量语义搜索文献：每批查询一次编码 + 一次多查询检索，按输入顺序逐条产出 [(Document, 距离)]"""
+        collection = self.client.get_collection("paper_collection")
+        for start in range(0, len(queries), batch_size):
+            embeddings = self._embed_queries(queries[start:start + batch_size])
+            results = collection.query(
+                query_embeddings=embeddings,
+                n_results=k,
+                include=["documents", "metadatas", "distances"]
+            )
+            for docs, metas, distances in zip(results['documents'], results['metadatas'], results['distances']):
+                yield [(Document(page_content=doc, metadata=meta or {}), dist)
+                       for doc, meta, dist in zip(docs, metas, distances)]
\ No newline at end of file
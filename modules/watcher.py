@@ -0,0 +1,166 @@
+import os
+import time
+import threading
+from modules.config import (WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL, WATCH_RETRY_BACKOFF,
+                            WATCH_RETRY_MAX_BACKOFF)
+
+# inotify 通过 watchdog 使用；未安装时自动退化为轮询扫描
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """把 watchdog 事件转交给 FolderWatcher 的去抖队列"""
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path)
+
+
+class FolderWatcher:
+    """监听一个或多个目录，返回已写完 (大小与修改时间稳定) 的新文件
+
+    known 为已入库文件的 {绝对路径: 修改时间}，启动时这些未变化的文件不会再次交付；
+    修改时间为 None 表示只知道已入库、不知道入库时的版本，同样视为已交付。
+    include_existing=False 时忽略启动时已存在的全部文件。
+    """
+
+    def __init__(self, dirs, extensions, debounce=WATCH_DEBOUNCE_SECONDS,
+                 poll_interval=WATCH_POLL_INTERVAL, use_inotify=True, include_existing=True, known=None):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and WATCHDOG_AVAILABLE
+
+        self._lock = threading.Lock()
+        # path -> (size, mtime, 最近一次发生变化的时间)
+        self._pending = {}
+        # path -> (size, mtime)，已交付过的文件，避免原地保存的图片被重复入库
+        self._delivered = {}
+        # path -> 失败次数，用于重试退避
+        self._retries = {}
+        self._observer = None
+
+        known = known or {}
+        for path in self._scan():
+            stat = self._stat(path)
+            if stat is None:
+                continue
+            if not include_existing or (path in known and known[path] in (None, stat[1])):
+                self._delivered[path] = stat
+
+    @property
+    def mode(self):
+        return "inotify" if self.use_inotify else "polling"
+
+    def _matches(self, path):
+        return path.lower().endswith(self.extensions) and not os.path.basename(path).startswith('.')
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
+
+    def _scan(self):
+        for d in self.dirs:
+            for root, _, files in os.walk(d):
+                for file in files:
+                    path = os.path.join(root, file)
+                    if self._matches(path):
+                        yield path
+
+    def start(self):
+        """启动监听：先登记已有文件，inotify 可用时再注册事件回调"""
+        for path in self._scan():
+            self.notify(path)
+
+        if self.use_inotify:
+            self._observer = Observer()
+            handler = _ChangeHandler(self)
+            for d in self.dirs:
+                self._observer.schedule(handler, d, recursive=True)
+            self._observer.start()
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def notify(self, path):
+        """登记一个可能发生变化的文件 (可由 watchdog 线程调用)"""
+        path = os.path.abspath(path)
+        if not self._matches(path):
+            return
+        stat = self._stat(path)
+        if stat is None:
+            return
+        with self._lock:
+            if self._delivered.get(path) == stat:
+                return
+            previous = self._pending.get(path)
+            if previous is None or previous[:2] != stat:
+                self._pending[path] = (stat[0], stat[1], time.monotonic())
+
+    def poll(self):
+        """返回去抖完成、可以安全读取的文件列表"""
+        if not self.use_inotify:
+            for path in self._scan():
+                self.notify(path)
+
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, (size, mtime, changed_at) in list(self._pending.items()):
+                stat = self._stat(path)
+                if stat is None:
+                    # 文件已被删除或移走
+                    del self._pending[path]
+                elif stat != (size, mtime):
+                    # 仍在写入，重新计时
+                    self._pending[path] = (stat[0], stat[1], now)
+                elif size > 0 and now - changed_at >= self.debounce:
+                    ready.append(path)
+                    self._delivered[path] = stat
+                    del self._pending[path]
+        return sorted(ready)
+
+    def requeue(self, path):
+        """入库失败的文件重新排队，按失败次数指数退避，返回本次等待的秒数"""
+        path = os.path.abspath(path)
+        stat = self._stat(path)
+        with self._lock:
+            self._delivered.pop(path, None)
+            retries = self._retries.get(path, 0)
+            self._retries[path] = retries + 1
+            delay = min(WATCH_RETRY_BACKOFF * 2 ** retries, WATCH_RETRY_MAX_BACKOFF)
+            if stat is not None:
+                # 把"最近变化时间"推到未来，poll() 在去抖 + 退避之后才会再次返回它
+                self._pending[path] = (stat[0], stat[1], time.monotonic() + delay)
+        return delay
+
+    def queue_depth(self):
+        """尚在等待去抖的文件数"""
+        with self._lock:
+            return len(self._pending)
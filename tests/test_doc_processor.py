@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip("langchain_core.documents")
+pytest.importorskip("langchain_community.document_loaders")
+pytest.importorskip("langchain_text_splitters")
+
+from langchain_core.documents import Document
+from modules.doc_processor import DocumentProcessor
+
+
+def _sections(*pages, **kwargs):
+    docs = [Document(page_content="\n".join(lines), metadata={"page": i}) for i, lines in enumerate(pages)]
+    sections = DocumentProcessor(**kwargs)._section_documents(docs)
+    return [(s.metadata["section"], s.page_content) for s in sections]
+
+
+def _names(sections):
+    return [name for name, _ in sections]
+
+
+def test_references_at_the_end_are_skipped():
+    sections = _sections(
+        ["Deep Nets", "Alice", "Abstract", "We study nets.", "1 Introduction", "Nets are deep."],
+        ["2 Method", "We train nets.", "References", "[1] A. Author. A paper. 2020."],
+    )
+    assert _names(sections) == ["Abstract", "Introduction", "Method"]
+    assert all("A paper" not in text for _, text in sections)
+    assert "Alice" not in sections[0][1]  # 摘要之前的作者信息被去掉
+
+
+def test_appendix_after_references_is_skipped():
+    sections = _sections(
+        ["1 Introduction", "Body text.", "References", "[1] Ref."],
+        ["Appendix A: Proofs", "Proof of lemma."],
+    )
+    assert _names(sections) == ["Introduction"]
+
+
+def test_inline_abstract_cuts_front_matter():
+    sections = _sections(["A Title", "Bob, Some University", "Abstract—We propose a method.", "I. INTRODUCTION",
+                          "Intro text."])
+    assert _names(sections) == ["Abstract", "INTRODUCTION"]
+    assert sections[0][1] == "Abstract—We propose a method."
+
+
+def test_wrapped_lowercase_references_is_body_text():
+    sections = _sections(["1 Introduction", "as shown in the", "references", "below, nets work."])
+    assert _names(sections) == ["Introduction"]
+    assert "references" in sections[0][1]
+
+
+def test_numbered_reference_entry_does_not_end_skip():
+    sections = _sections(
+        ["1 Introduction", "Body.", "2 Method", "More body.", "References"],
+        ["1 Deep Residual Learning", "2 Attention Is All You Need", "V Mnih and K Kavukcuoglu"],
+        ["3 Experiments", "Results after references."],
+    )
+    assert _names(sections) == ["Introduction", "Method", "Experiments"]
+    assert all("Attention" not in text and "Mnih" not in text for _, text in sections)
+
+
+def test_sentence_starting_with_number_is_not_a_heading():
+    sections = _sections(["1 Introduction", "2 The proposed method is Good", "V Mnih and K Kavukcuoglu",
+                          "2 Method", "Body."])
+    assert _names(sections) == ["Introduction", "Method"]
+    assert "proposed method" in sections[0][1]
+
+
+def test_repeated_headers_and_footers_are_stripped():
+    bodies = [("Nets are deep.", "Very deep."), ("Training is slow.", "See the table."),
+              ("Results are good.", "Mostly."), ("We conclude.", "Thanks.")]
+    pages = [["Conference 2024", first, second, str(i + 1)] for i, (first, second) in enumerate(bodies)]
+    pages[0][1:1] = ["1 Introduction"]
+    sections = _sections(*pages)
+    assert _names(sections) == ["Introduction"] * 4
+    assert all("Conference" not in text for _, text in sections)
+    assert sections[1][1] == "Training is slow.\nSee the table."
@@ -0,0 +1,127 @@
+import os
+import shutil
+from types import SimpleNamespace
+from modules.ingest import chunk_ids, commit_papers, finish_interrupted_moves
+from modules.journal import BatchJournal
+
+
+class _FakeDB:
+    """按 Chroma 的行为模拟文献库：同一次写入里出现重复 id 时报错"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def add_documents(self, documents, ids):
+        assert len(set(ids)) == len(ids), "DuplicateIDError"
+        for doc, i in zip(documents, ids):
+            self.rows[i] = (doc.page_content, dict(doc.metadata))
+
+    def document_ids(self, source):
+        return [i for i, (_, meta) in self.rows.items() if meta["source"] == source]
+
+    def delete_documents(self, ids):
+        for i in ids:
+            self.rows.pop(i, None)
+
+    def get_documents(self, ids):
+        found = [i for i in ids if i in self.rows]
+        return {"ids": found, "documents": [self.rows[i][0] for i in found],
+                "metadatas": [self.rows[i][1] for i in found], "embeddings": [None] * len(found)}
+
+    def restore_documents(self, snapshot):
+        for i, doc, meta in zip(snapshot["ids"], snapshot["documents"], snapshot["metadatas"]):
+            self.rows[i] = (doc, meta)
+
+
+class _FakeProcessor:
+    def __init__(self, docs_dir, fail_moves=False):
+        self.docs_dir = docs_dir
+        self.fail_moves = fail_moves
+
+    def target_path(self, file_path, category):
+        return os.path.join(self.docs_dir, category, os.path.basename(file_path))
+
+    def move_file(self, file_path, category, target_path=None):
+        if self.fail_moves:
+            raise OSError("disk full")
+        target_path = target_path or self.target_path(file_path, category)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        shutil.move(file_path, target_path)
+        return target_path
+
+
+def _pdf(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    return str(path)
+
+
+def _splits(*texts):
+    return [SimpleNamespace(page_content=t, metadata={}) for t in texts]
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_same_name_in_one_batch_gets_unique_targets(tmp_path):
+    db, processor = _FakeDB(), _FakeProcessor(str(tmp_path / "docs"))
+    first = _pdf(tmp_path / "a" / "paper.pdf", "first")
+    second = _pdf(tmp_path / "b" / "paper.pdf", "second")
+
+    committed = commit_papers([(first, "NLP", _splits("x")), (second, "NLP", _splits("y"))], db, processor)
+
+    assert committed == [first, second]
+    kept = str(tmp_path / "docs" / "NLP" / "paper.pdf")
+    renamed = str(tmp_path / "docs" / "NLP" / "paper (1).pdf")
+    assert _read(kept) == "first" and _read(renamed) == "second"
+    assert [db.rows[i][0] for i in db.document_ids(renamed)] == ["y"]
+
+
+def test_existing_archive_with_other_content_is_not_overwritten(tmp_path):
+    db, processor = _FakeDB(), _FakeProcessor(str(tmp_path / "docs"))
+    archived = _pdf(tmp_path / "docs" / "NLP" / "paper.pdf", "old")
+    db.add_documents([SimpleNamespace(page_content="old chunk", metadata={"source": archived})],
+                     ids=chunk_ids(archived, 1))
+
+    new = _pdf(tmp_path / "in" / "paper.pdf", "new")
+    commit_papers([(new, "NLP", _splits("a", "b"))], db, processor)
+
+    assert _read(archived) == "old"
+    assert [db.rows[i][0] for i in db.document_ids(archived)] == ["old chunk"]
+    assert len(db.document_ids(str(tmp_path / "docs" / "NLP" / "paper (1).pdf"))) == 2
+
+
+def test_failed_move_restores_overwritten_chunks(tmp_path):
+    db, processor = _FakeDB(), _FakeProcessor(str(tmp_path / "docs"), fail_moves=True)
+    archived = _pdf(tmp_path / "docs" / "NLP" / "paper.pdf", "same")
+    old_ids = chunk_ids(archived, 1)
+    db.add_documents([SimpleNamespace(page_content="old chunk", metadata={"source": archived})], ids=old_ids)
+
+    # 同一份文件重新投放：沿用原归档路径，覆盖写入后移动失败
+    again = _pdf(tmp_path / "in" / "paper.pdf", "same")
+    assert commit_papers([(again, "NLP", _splits("new 0", "new 1"))], db, processor) == []
+
+    assert db.rows == {old_ids[0]: ("old chunk", {"source": archived})}
+    assert os.path.exists(again)
+
+
+def test_resume_cleans_stale_chunks_before_done(tmp_path):
+    db, processor = _FakeDB(), _FakeProcessor(str(tmp_path / "docs"))
+    source = _pdf(tmp_path / "in" / "paper.pdf", "content")
+    target = processor.target_path(source, "NLP")
+    ids = chunk_ids(target, 3)
+    db.add_documents([SimpleNamespace(page_content=str(n), metadata={"source": target}) for n in range(3)], ids=ids)
+
+    journal_args = ("papers", str(tmp_path / "in"))
+    with BatchJournal(*journal_args, journal_dir=str(tmp_path / "journals")) as journal:
+        # 上次运行只切出 1 个片段，写库后、移动前被中断
+        journal.record(source, "indexed", category="NLP", target=target, chunks=1)
+    with BatchJournal(*journal_args, resume=True, journal_dir=str(tmp_path / "journals")) as journal:
+        finish_interrupted_moves(journal, db, processor)
+        assert journal.stage(source) == "done"
+
+    assert _read(target) == "content"
+    assert sorted(db.rows) == ids[:1]
@@ -0,0 +1,49 @@
+import json
+from modules.journal import BatchJournal
+
+
+def _open(tmp_path, resume):
+    return BatchJournal("papers", str(tmp_path / "src"), resume=resume, journal_dir=str(tmp_path / "journals"))
+
+
+def test_resume_replays_latest_stage(tmp_path):
+    with _open(tmp_path, resume=False) as journal:
+        journal.record("a.pdf", "indexed", category="NLP", target="documents/NLP/a.pdf")
+        journal.record("a.pdf", "done", category="NLP", target="documents/NLP/a.pdf")
+        journal.record_many(["b.png", "c.png"], "failed")
+
+    with _open(tmp_path, resume=True) as journal:
+        assert journal.stage("a.pdf") == "done"
+        assert journal.stage("b.png") == "failed"
+        assert journal.stage("missing.pdf") is None
+        assert journal.entries("indexed") == []
+
+
+def test_resume_without_flag_starts_fresh(tmp_path):
+    with _open(tmp_path, resume=False) as journal:
+        journal.record("a.pdf", "done")
+
+    with _open(tmp_path, resume=False) as journal:
+        assert journal.stage("a.pdf") is None
+
+
+def test_torn_last_line_is_truncated_before_appending(tmp_path):
+    with _open(tmp_path, resume=False) as journal:
+        journal.record("a.pdf", "indexed", category="NLP", target="documents/NLP/a.pdf")
+        path = journal.path
+    # 模拟进程在写入一条记录的中途被杀
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"file": "b.pdf", "sta')
+
+    with _open(tmp_path, resume=True) as journal:
+        assert journal.stage("a.pdf") == "indexed"
+        assert journal.stage("b.pdf") is None
+        journal.record("c.pdf", "done")
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)["stage"] for line in lines] == ["indexed", "done"]
+
+    with _open(tmp_path, resume=True) as journal:
+        assert journal.stage("a.pdf") == "indexed"
+        assert journal.stage("c.pdf") == "done"
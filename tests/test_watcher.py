@@ -0,0 +1,95 @@
+import os
+import modules.watcher as watcher_module
+from modules.watcher import FolderWatcher
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _watcher(tmp_path, monkeypatch, **kwargs):
+    clock = _Clock()
+    monkeypatch.setattr(watcher_module.time, "monotonic", clock)
+    watcher = FolderWatcher([str(tmp_path)], (".png",), debounce=2.0, use_inotify=False, **kwargs)
+    watcher.start()
+    return watcher, clock
+
+
+def _write(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def test_growing_file_is_delivered_after_it_stops_changing(tmp_path, monkeypatch):
+    watcher, clock = _watcher(tmp_path, monkeypatch)
+    image = tmp_path / "a.png"
+    _write(image, b"x")
+    assert watcher.poll() == []
+
+    clock.now += 1.5
+    _write(image, b"more")
+    assert watcher.poll() == []  # 仍在写入，重新计时
+    clock.now += 1.5
+    assert watcher.poll() == []
+
+    clock.now += 1.0
+    assert watcher.poll() == [str(image)]
+    assert watcher.poll() == []
+
+
+def test_requeue_backs_off_exponentially(tmp_path, monkeypatch):
+    monkeypatch.setattr(watcher_module, "WATCH_RETRY_BACKOFF", 10.0)
+    image = tmp_path / "a.png"
+    _write(image, b"x")
+    watcher, clock = _watcher(tmp_path, monkeypatch)
+    clock.now += 2.0
+    assert watcher.poll() == [str(image)]
+
+    assert watcher.requeue(str(image)) == 10.0
+    clock.now += 11.0
+    assert watcher.poll() == []
+    clock.now += 1.0
+    assert watcher.poll() == [str(image)]
+
+    assert watcher.requeue(str(image)) == 20.0
+    clock.now += 21.0
+    assert watcher.poll() == []
+    clock.now += 1.0
+    assert watcher.poll() == [str(image)]
+
+
+def test_include_existing_false_ignores_startup_files(tmp_path, monkeypatch):
+    old, new = tmp_path / "old.png", tmp_path / "new.png"
+    _write(old, b"x")
+    watcher, clock = _watcher(tmp_path, monkeypatch, include_existing=False)
+    _write(new, b"x")
+    watcher.poll()
+    clock.now += 2.0
+    assert watcher.poll() == [str(new)]
+
+
+def test_known_unchanged_files_are_not_redelivered(tmp_path, monkeypatch):
+    same, changed, legacy, fresh = (tmp_path / n for n in ("same.png", "changed.png", "legacy.png", "fresh.png"))
+    for image in (same, changed, legacy, fresh):
+        _write(image, b"x")
+    known = {str(same): os.path.getmtime(same), str(changed): os.path.getmtime(changed) - 5, str(legacy): None}
+    watcher, clock = _watcher(tmp_path, monkeypatch, known=known)
+    clock.now += 2.0
+    assert watcher.poll() == [str(changed), str(fresh)]
+
+
+def test_deleted_pending_file_is_dropped(tmp_path, monkeypatch):
+    watcher, clock = _watcher(tmp_path, monkeypatch)
+    image = tmp_path / "a.png"
+    _write(image, b"x")
+    watcher.poll()
+    assert watcher.queue_depth() == 1
+
+    os.remove(image)
+    clock.now += 2.0
+    assert watcher.poll() == []
+    assert watcher.queue_depth() == 0